@@ -1,23 +1,66 @@
+from __future__ import annotations
+
+import functools
+import gzip
+import json
 import logging
-import pickle
+import math
 import shutil
+import time
 from enum import StrEnum
 from pathlib import Path
+from typing import IO, TYPE_CHECKING
+
+# Selenium takes a noticeable time to import, so it is only imported when a
+# driver is made. Commands like clear-cookies and --version never need it.
+if TYPE_CHECKING:
+    from selenium.webdriver.chrome.webdriver import WebDriver as ChromeWebDriver
+    from selenium.webdriver.firefox.webdriver import WebDriver as FirefoxWebDriver
 
-from selenium import webdriver
-from selenium.common.exceptions import WebDriverException
-from selenium.webdriver.chrome.options import Options as ChromeOptions
-from selenium.webdriver.chrome.service import Service as ChromeService
-from selenium.webdriver.chrome.webdriver import WebDriver as ChromeWebDriver
-from selenium.webdriver.firefox.options import Options as FirefoxOptions
-from selenium.webdriver.firefox.service import Service as FirefoxService
-from selenium.webdriver.firefox.webdriver import WebDriver as FirefoxWebDriver
+    WebDriver = ChromeWebDriver | FirefoxWebDriver
 
 logger = logging.getLogger(__name__)
 
-WebDriver = ChromeWebDriver | FirefoxWebDriver
+DRIVER_PATH_CACHE_TTL_S = 24 * 60 * 60
+
+# Open lock files for the profile directories this process is using. A profile
+# stays locked until the process exits, when the OS releases the lock.
+_profile_locks: list[IO] = []
+
+# LinkedIn's authentication cookie
+SESSION_COOKIE_NAME = "li_at"
+
+# Resources that play no part in reading a job count. LinkedIn's own scripts
+# (static.licdn.com) are not blocked, since the page is rendered by them.
+# Network.setBlockedURLs matches a pattern against the whole URL, so each ends
+# in a wildcard to also match URLs with a query string or fragment. Hashed assets
+# under static.licdn.com/aero-v1/sc/h/ have no extension and share that path
+# with the scripts, so they can't be told apart by URL and are let through.
+BLOCKED_URL_PATTERNS = (
+    # Styles, images, fonts and media
+    "*.css*",
+    "*.gif*",
+    "*.jpeg*",
+    "*.jpg*",
+    "*.mp4*",
+    "*.png*",
+    "*.svg*",
+    "*.ttf*",
+    "*.webp*",
+    "*.woff*",
+    # Profile photos and company logos, which are served without an extension
+    "*media.licdn.com/dms/image/*",
+    # Ads, analytics and tracking beacons, on the bare domain or any subdomain
+    "*doubleclick.net/*",
+    "*google-analytics.com/*",
+    "*googletagmanager.com/*",
+    "*px.ads.linkedin.com/*",
+    "*linkedin.com/li/track*",
+)
 
-DEFAULT_COOKIE_DIR = Path("~/.local/share/job-count").expanduser()
+
+class NotLoggedInError(Exception):
+    pass
 
 
 class Browser(StrEnum):
@@ -25,31 +68,144 @@ class Browser(StrEnum):
     FIREFOX = "firefox"
 
 
+# Resolved lazily so that commands like --version don't look up the home directory
+@functools.cache
+def default_cookie_dir() -> Path:
+    return Path("~/.local/share/job-count").expanduser()
+
+
+@functools.cache
+def default_cache_dir() -> Path:
+    return Path("~/.cache/job-count").expanduser()
+
+
+def get_cached_binary_paths(browser: Browser) -> tuple[Path, Path] | None:
+    cache_path = default_cache_dir() / f"driver_path_{browser.value}.json"
+    try:
+        cached = json.loads(cache_path.read_text(encoding="utf-8"))
+        driver_path = Path(cached["path"])
+        browser_path = Path(cached["browser_path"])
+        resolved_at = cached["resolved_at"]
+    except (FileNotFoundError, KeyError, ValueError):
+        return None
+
+    if time.time() - resolved_at > DRIVER_PATH_CACHE_TTL_S:
+        return None
+    if not driver_path.is_file() or not browser_path.is_file():
+        return None
+    return driver_path, browser_path
+
+
+def cache_binary_paths(browser: Browser, driver_path: Path, browser_path: Path):
+    cache_path = default_cache_dir() / f"driver_path_{browser.value}.json"
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    cached = {
+        "path": str(driver_path),
+        "browser_path": str(browser_path),
+        "resolved_at": time.time(),
+    }
+    cache_path.write_text(json.dumps(cached), encoding="utf-8")
+    logger.debug(
+        f"Cached {browser.value} driver path {driver_path} and browser path "
+        f"{browser_path}"
+    )
+
+
+def get_profile_dir(browser: Browser, name: str) -> Path:
+    return default_cache_dir() / "profile" / browser.value / name
+
+
+def try_lock_file(lock_file: IO) -> bool:
+    # fcntl is Unix only and msvcrt Windows only, so import whichever exists here
+    try:
+        import fcntl
+    except ImportError:
+        import msvcrt
+
+        try:
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+
+def lock_profile_dir(browser: Browser, prefix: str) -> Path:
+    """Lock and return the first profile directory not in use by another driver.
+
+    A browser profile can only be open in one browser at a time, so concurrent
+    runs, or workers within a run, each need their own.
+    """
+    i = 0
+    while True:
+        profile_dir = get_profile_dir(browser, f"{prefix}-{i}")
+        profile_dir.parent.mkdir(parents=True, exist_ok=True)
+        # Not closed here: the lock lasts only as long as the file is open, which
+        # is until the process exits (see _profile_locks)
+        lock_path = profile_dir.with_name(f"{profile_dir.name}.lock")
+        lock_file = open(lock_path, "w")  # noqa: SIM115
+        if try_lock_file(lock_file):
+            _profile_locks.append(lock_file)
+            return profile_dir
+        lock_file.close()
+        i += 1
+
+
 def make_driver(
     browser: Browser,
     headless: bool,
     driver_path: Path | None,
+    profile_dir: Path | None = None,
+    block_resources: bool = False,
 ) -> ChromeWebDriver | FirefoxWebDriver:
 
+    from selenium import webdriver
+    from selenium.common.exceptions import SessionNotCreatedException
+    from selenium.webdriver.chrome.options import Options as ChromeOptions
+    from selenium.webdriver.chrome.service import Service as ChromeService
+    from selenium.webdriver.common.driver_finder import DriverFinder
+    from selenium.webdriver.firefox.options import Options as FirefoxOptions
+    from selenium.webdriver.firefox.service import Service as FirefoxService
+
+    # A persistent profile keeps the browser's HTTP cache between runs, so
+    # LinkedIn's scripts and styles aren't downloaded again every time
+    if profile_dir:
+        profile_dir.mkdir(parents=True, exist_ok=True)
+
     match browser:
         case Browser.CHROME:
             options = ChromeOptions()
+            # Return from driver.get() at DOMContentLoaded rather than waiting on
+            # every image, tracker and ad; the job count is read from the DOM.
+            options.page_load_strategy = "eager"
             if headless:
                 options.add_argument("--headless")
-            if driver_path:
-                service = ChromeService(executable_path=str(driver_path))
-                driver = webdriver.Chrome(service=service, options=options)
-            else:
-                driver = webdriver.Chrome(options=options)
+            if profile_dir:
+                options.add_argument(f"--user-data-dir={profile_dir}")
+                options.add_argument("--disk-cache-size=134217728")
+            if block_resources:
+                options.add_argument("--blink-settings=imagesEnabled=false")
+                options.add_experimental_option(
+                    "prefs", {"profile.managed_default_content_settings.images": 2}
+                )
+            service_cls, driver_cls = ChromeService, webdriver.Chrome
         case Browser.FIREFOX:
             options = FirefoxOptions()
+            options.page_load_strategy = "eager"
             if headless:
                 options.add_argument("--headless")
-            if driver_path:
-                service = FirefoxService(executable_path=str(driver_path))
-                driver = webdriver.Firefox(service=service, options=options)
-            else:
-                driver = webdriver.Firefox(options=options)
+            if profile_dir:
+                options.add_argument("-profile")
+                options.add_argument(str(profile_dir))
+            if block_resources:
+                options.set_preference("permissions.default.image", 2)
+                options.set_preference("browser.display.use_document_fonts", 0)
+            service_cls, driver_cls = FirefoxService, webdriver.Firefox
         case _:
             raise ValueError(f"Unsupported browser: {browser}")
     # except WebDriverException as e:
@@ -59,29 +215,96 @@ def make_driver(
     #         f"{', '.join(list(Browser))}.\nError: {e}"
     #     )
     #     exit(1)
+
+    def start_driver(
+        path: Path, browser_path: Path | None = None
+    ) -> ChromeWebDriver | FirefoxWebDriver:
+        # An explicit driver path makes Selenium skip Selenium Manager, which is
+        # what would otherwise point the options at a browser it downloaded
+        options.binary_location = str(browser_path) if browser_path else ""
+        service = service_cls(executable_path=str(path))
+        return driver_cls(service=service, options=options)
+
+    driver = None
+    cached_paths = None
+    cached_error = None
+    if driver_path:
+        driver = start_driver(driver_path)
+    # Selenium Manager shells out to find the driver on every start, so reuse the
+    # paths it found last time unless that driver no longer works
+    elif cached_paths := get_cached_binary_paths(browser):
+        cached_driver_path, cached_browser_path = cached_paths
+        try:
+            driver = start_driver(cached_driver_path, cached_browser_path)
+        except SessionNotCreatedException as e:
+            cached_error = e
+            logger.info(
+                f"Cached driver {cached_driver_path} failed, resolving again: {e.msg}"
+            )
+
+    if driver is None:
+        options.binary_location = ""
+        finder = DriverFinder(service_cls(), options)
+        resolved_driver_path = Path(finder.get_driver_path())
+        resolved_browser_path = Path(finder.get_browser_path())
+        # Nothing has changed since the paths were cached, so the cache was not
+        # the problem; the browser failed to start for some other reason, such as
+        # its profile being in use
+        resolved_paths = (resolved_driver_path, resolved_browser_path)
+        if cached_error and cached_paths == resolved_paths:
+            raise cached_error
+        cache_binary_paths(browser, resolved_driver_path, resolved_browser_path)
+        driver = start_driver(resolved_driver_path, resolved_browser_path)
+
+    # Chrome can drop requests by URL before they reach the network. Fetch.enable
+    # could block by resource type instead, but it pauses each matching request
+    # until a Fetch.requestPaused handler answers, and execute_cdp_cmd can't
+    # listen for events.
+    if block_resources and browser == Browser.CHROME:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd(
+            "Network.setBlockedURLs", {"urls": list(BLOCKED_URL_PATTERNS)}
+        )
+
     return driver
 
 
+@functools.lru_cache(maxsize=8)
 def get_cookie_path(cookie_dir: Path, browser: Browser) -> Path:
-    return cookie_dir / browser.value / "cookies.pkl"
+    return cookie_dir / browser.value / "cookies.json.gz"
 
 
 def save_cookies(driver: WebDriver, cookie_path: Path):
     cookie_path.parent.mkdir(parents=True, exist_ok=True)
-
-    with cookie_path.open("wb") as f:
-        pickle.dump(driver.get_cookies(), f)
+    cookies_json = json.dumps(driver.get_cookies()).encode("utf-8")
+    cookie_path.write_bytes(gzip.compress(cookies_json, compresslevel=3))
     logger.info(f"Cookies saved to {cookie_path}")
 
 
+def read_cookies(cookie_path: Path) -> list[dict]:
+    return json.loads(gzip.decompress(cookie_path.read_bytes()))
+
+
+def has_live_session(cookies: list[dict]) -> bool:
+    for cookie in cookies:
+        if cookie["name"] == SESSION_COOKIE_NAME:
+            # A cookie without an expiry lasts as long as the browser session
+            return cookie.get("expiry", math.inf) > time.time()
+    return False
+
+
 def load_cookies(driver: WebDriver, cookie_path: Path) -> bool:
     if cookie_path.exists():
-        with cookie_path.open("rb") as f:
-            cookies = pickle.load(f)
-            for cookie in cookies:
-                driver.add_cookie(cookie)
+        cookies = read_cookies(cookie_path)
+        if not has_live_session(cookies):
+            logger.error(
+                f"The LinkedIn session saved at {cookie_path} has expired. Run the "
+                "login command again."
+            )
+            return False
+        for cookie in cookies:
+            driver.add_cookie(cookie)
         logger.info("Cookies restored!")
-        driver.refresh()
         return True
     else:
         logger.error(
@@ -1,9 +1,10 @@
 import argparse
+import sys
 from argparse import ArgumentParser
 from pathlib import Path
 from typing import Literal, Self, Union
 
-from pydantic import BaseModel, field_validator, model_validator
+from pydantic import BaseModel, PositiveInt, field_validator, model_validator
 
 from job_count import __project_name__, __version__
 from job_count.browser import Browser
@@ -19,6 +20,8 @@ class QueryArgs(BaseModel):
     driver_path: Path | None = None
     no_headless: bool = False
     cookie_dir: Path | None
+    workers: PositiveInt = 1
+    socket_path: Path | None = None
     verbose: int = 0
     quiet: int = 0
     log_file: str | None = None
@@ -59,7 +62,32 @@ class ClearCookiesCliArgs(BaseModel):
     browser: Browser = Browser.CHROME
 
 
-CliArgs = Union[QueryArgs, LoginCliArgs, ClearCookiesCliArgs]
+class ServeCliArgs(BaseModel):
+    command: Literal["serve"] = "serve"
+    browser: Browser = Browser.CHROME
+    driver_path: Path | None = None
+    no_headless: bool = False
+    cookie_dir: Path | None
+    socket_path: Path | None = None
+    verbose: int = 0
+    quiet: int = 0
+    log_file: str | None = None
+
+
+BROWSER_CHOICES = tuple(browser.value for browser in Browser)
+
+CliArgs = Union[QueryArgs, LoginCliArgs, ClearCookiesCliArgs, ServeCliArgs]
+
+
+def positive_int(value: str) -> int:
+    # Checked here, not only by pydantic, so a bad value gets argparse's usage error
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: '{value}'") from None
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
 
 
 def add_logging_args(parser: ArgumentParser) -> ArgumentParser:
@@ -88,25 +116,7 @@ def add_logging_args(parser: ArgumentParser) -> ArgumentParser:
     return parser
 
 
-def setup_parser() -> ArgumentParser:
-
-    # Root parser
-    root_parser = argparse.ArgumentParser(
-        prog=__project_name__,
-        description=("A CLI tool for counting job postings on LinkedIn."),
-        add_help=True,
-        formatter_class=argparse.RawTextHelpFormatter,
-    )
-    root_parser.add_argument(
-        "--version", "-V", action="version", version=f"{__project_name__} {__version__}"
-    )
-
-    # Logging parser
-    command_parsers = root_parser.add_subparsers(
-        title="commands", dest="command", required=True
-    )
-
-    # Login parser
+def add_login_parser(command_parsers: argparse._SubParsersAction) -> ArgumentParser:
     login_parser = command_parsers.add_parser(
         "login",
         add_help=True,
@@ -120,7 +130,7 @@ def setup_parser() -> ArgumentParser:
             "'chrome'."
         ),
         required=False,
-        choices=[browser.value for browser in Browser],
+        choices=BROWSER_CHOICES,
         default=Browser.CHROME.value,
         type=str,
     )
@@ -151,8 +161,10 @@ def setup_parser() -> ArgumentParser:
         type=int,
     )
     add_logging_args(login_parser)
+    return login_parser
 
-    # Query parser
+
+def add_query_parser(command_parsers: argparse._SubParsersAction) -> ArgumentParser:
     query_parser = command_parsers.add_parser(
         "query",
         add_help=True,
@@ -197,7 +209,7 @@ def setup_parser() -> ArgumentParser:
             "'chrome'."
         ),
         required=False,
-        choices=[browser.value for browser in Browser],
+        choices=BROWSER_CHOICES,
         default=Browser.CHROME.value,
         type=str,
     )
@@ -227,9 +239,37 @@ def setup_parser() -> ArgumentParser:
         default=None,
         type=str,
     )
+    query_parser.add_argument(
+        "--workers",
+        "-w",
+        help=(
+            "Number of browsers to run searches in parallel. Default is 1. Higher "
+            "values are faster but more likely to be rate limited by LinkedIn."
+        ),
+        required=False,
+        default=1,
+        type=positive_int,
+    )
+    query_parser.add_argument(
+        "--socket",
+        "-s",
+        dest="socket_path",
+        help=(
+            "Path of the Unix socket of a running 'job-count serve' daemon. Defaults "
+            "to driver.sock in the cookie directory."
+        ),
+        metavar="socket_path",
+        required=False,
+        default=None,
+        type=str,
+    )
     add_logging_args(query_parser)
+    return query_parser
+
 
-    # Clear cookies parser
+def add_clear_cookies_parser(
+    command_parsers: argparse._SubParsersAction,
+) -> ArgumentParser:
     clear_cookies_parser = command_parsers.add_parser(
         "clear-cookies",
         add_help=True,
@@ -243,7 +283,7 @@ def setup_parser() -> ArgumentParser:
             "'chrome'."
         ),
         required=False,
-        choices=[browser.value for browser in Browser],
+        choices=BROWSER_CHOICES,
         default=Browser.CHROME.value,
         type=str,
     )
@@ -259,6 +299,106 @@ def setup_parser() -> ArgumentParser:
         type=str,
     )
     add_logging_args(clear_cookies_parser)
+    return clear_cookies_parser
+
+
+def add_serve_parser(command_parsers: argparse._SubParsersAction) -> ArgumentParser:
+    serve_parser = command_parsers.add_parser(
+        "serve",
+        add_help=True,
+        description="Keep a logged-in browser running in the background. While it "
+        "is running, query commands use it instead of starting their own browser.",
+    )
+    serve_parser.add_argument(
+        "--browser",
+        "-b",
+        help=(
+            "Choose the browser to use. Options are 'chrome' 'firefox'.  Default is "
+            "'chrome'."
+        ),
+        required=False,
+        choices=BROWSER_CHOICES,
+        default=Browser.CHROME.value,
+        type=str,
+    )
+    serve_parser.add_argument(
+        "--driver-path",
+        "-d",
+        help="The path to the Chromedriver or Geckodriver executable",
+        metavar="browser_path",
+        type=str,
+        required=False,
+    )
+    serve_parser.add_argument(
+        "--no-headless",
+        "-N",
+        help="Run the tool in a headed browser window.",
+        required=False,
+        action="store_true",
+    )
+    serve_parser.add_argument(
+        "--cookie-dir",
+        "-c",
+        help=(
+            "Path to a directory for storing cookies (to prevent needing to login each "
+            "time). Defaults to ~/.local/share/job-count."
+        ),
+        required=False,
+        default=None,
+        type=str,
+    )
+    serve_parser.add_argument(
+        "--socket",
+        "-s",
+        dest="socket_path",
+        help=(
+            "Path of the Unix socket to listen on. Defaults to driver.sock in the "
+            "cookie directory."
+        ),
+        metavar="socket_path",
+        required=False,
+        default=None,
+        type=str,
+    )
+    add_logging_args(serve_parser)
+    return serve_parser
+
+
+COMMAND_PARSER_BUILDERS = {
+    "login": add_login_parser,
+    "query": add_query_parser,
+    "clear-cookies": add_clear_cookies_parser,
+    "serve": add_serve_parser,
+}
+
+
+def setup_parser(argv: list[str] | None = None) -> ArgumentParser:
+
+    # Root parser
+    root_parser = argparse.ArgumentParser(
+        prog=__project_name__,
+        description=("A CLI tool for counting job postings on LinkedIn."),
+        add_help=True,
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    root_parser.add_argument(
+        "--version", "-V", action="version", version=f"{__project_name__} {__version__}"
+    )
+
+    # Logging parser
+    command_parsers = root_parser.add_subparsers(
+        title="commands", dest="command", required=True
+    )
+
+    # Only build the parser for the command being run. Fall back to building all
+    # of them for --help, --version and unrecognised commands.
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else None
+    if command in COMMAND_PARSER_BUILDERS:
+        COMMAND_PARSER_BUILDERS[command](command_parsers)
+    else:
+        for add_command_parser in COMMAND_PARSER_BUILDERS.values():
+            add_command_parser(command_parsers)
 
     return root_parser
 
@@ -272,6 +412,8 @@ def parse_args(parser: ArgumentParser) -> CliArgs:
             args = QueryArgs.model_validate(vars(args_raw))
         case "clear-cookies":
             args = ClearCookiesCliArgs.model_validate(vars(args_raw))
+        case "serve":
+            args = ServeCliArgs.model_validate(vars(args_raw))
         case _:
             raise ValueError(f"Invalid command: {args_raw.command}")
     return args
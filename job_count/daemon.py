@@ -0,0 +1,142 @@
+import json
+import logging
+import socket
+from pathlib import Path
+from typing import BinaryIO, Callable
+
+from job_count.browser import Browser, NotLoggedInError
+
+logger = logging.getLogger(__name__)
+
+# Sent in an error response when the daemon's browser is no longer logged in
+NOT_LOGGED_IN_CODE = "not_logged_in"
+
+# Longest to wait for the daemon to answer one request. It serves one client at
+# a time, so this also bounds the wait while it is busy with another.
+REQUEST_TIMEOUT_S = 60
+
+
+def get_socket_path(data_dir: Path) -> Path:
+    return data_dir / "driver.sock"
+
+
+def connect_to_daemon(socket_path: Path) -> socket.socket | None:
+    # Some platforms, such as older Windows builds, have no Unix domain sockets
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(REQUEST_TIMEOUT_S)
+    try:
+        client.connect(str(socket_path))
+    except OSError as e:
+        # Any failure means there is no usable daemon, whether the socket is
+        # missing, not accepting connections, unreadable or too long a path
+        logger.debug(f"No job-count daemon at {socket_path}: {e}")
+        client.close()
+        return None
+    return client
+
+
+def send_request(stream: BinaryIO, request: dict) -> dict:
+    stream.write(json.dumps(request).encode() + b"\n")
+    stream.flush()
+
+    try:
+        line = stream.readline()
+    except TimeoutError:
+        raise ConnectionError(
+            f"job-count daemon did not respond within {REQUEST_TIMEOUT_S}s"
+        ) from None
+    if not line:
+        raise ConnectionError("job-count daemon closed the connection")
+    return json.loads(line)
+
+
+def get_daemon_browser(client: socket.socket) -> Browser | None:
+    with client.makefile("rwb") as stream:
+        response = send_request(stream, {"cmd": "info"})
+    if "browser" not in response:
+        return None
+    return Browser(response["browser"])
+
+
+def make_daemon_job_counter(client: socket.socket) -> Callable[[str, str], int]:
+
+    stream = client.makefile("rwb")
+
+    def count_job(job_title: str, location: str) -> int:
+        request = {"cmd": "count", "job_title": job_title, "location": location}
+        response = send_request(stream, request)
+        if response.get("code") == NOT_LOGGED_IN_CODE:
+            raise NotLoggedInError(response["error"])
+        if "error" in response:
+            raise ValueError(response["error"])
+        return response["count"]
+
+    return count_job
+
+
+def handle_request(
+    request: object, count_job: Callable[[str, str], int], browser: Browser
+) -> dict:
+    match request:
+        case {"cmd": "info"}:
+            return {"browser": browser.value}
+        case {"cmd": "count", "job_title": str(job_title), "location": str(location)}:
+            try:
+                count = count_job(job_title, location)
+            except NotLoggedInError as e:
+                logger.error(f"Not logged in: {e}")
+                return {"error": str(e), "code": NOT_LOGGED_IN_CODE}
+            except Exception as e:
+                logger.exception("Failed to count jobs")
+                return {"error": str(e)}
+            return {"count": count}
+        case _:
+            return {"error": f"Invalid request: {request}"}
+
+
+def serve(socket_path: Path, count_job: Callable[[str, str], int], browser: Browser):
+
+    if not hasattr(socket, "AF_UNIX"):
+        raise RuntimeError("serve needs Unix domain sockets, which are unavailable")
+
+    existing = connect_to_daemon(socket_path)
+    if existing is not None:
+        existing.close()
+        raise RuntimeError(f"A job-count daemon is already listening on {socket_path}")
+
+    # A socket left here is stale, from a daemon that did not shut down. Anything
+    # else was not made by us, so is never removed.
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+    if socket_path.is_socket():
+        socket_path.unlink()
+    elif socket_path.exists():
+        raise FileExistsError(f"{socket_path} exists and is not a socket")
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(str(socket_path))
+        server.listen()
+        logger.info(f"Listening on {socket_path}")
+
+        try:
+            while True:
+                conn, _ = server.accept()
+                logger.info("Client connected")
+                try:
+                    with conn, conn.makefile("rwb") as stream:
+                        for line in stream:
+                            try:
+                                request = json.loads(line)
+                            except json.JSONDecodeError:
+                                response = {"error": "Request is not valid JSON"}
+                            else:
+                                response = handle_request(request, count_job, browser)
+                            stream.write(json.dumps(response).encode() + b"\n")
+                            stream.flush()
+                except OSError as e:
+                    logger.warning(f"Lost connection to client: {e}")
+                logger.info("Client disconnected")
+        finally:
+            socket_path.unlink(missing_ok=True)
@@ -1,3 +1,4 @@
+import functools
 import logging
 import sys
 from logging import StreamHandler
@@ -33,19 +34,16 @@ def setup_logging(level: int, filename: str | None = None):
     sys.excepthook = log_uncaught_exceptions
 
 
-def get_log_level_for_verbosity(verbosity: int) -> int:
+# Log levels from quietest (-qq) to most verbose (-vv)
+LOG_LEVELS = (
+    logging.CRITICAL,
+    logging.ERROR,
+    logging.WARNING,
+    logging.INFO,
+    logging.DEBUG,
+)
 
-    if verbosity <= -2:
-        log_level = logging.CRITICAL
-    elif verbosity == -1:
-        log_level = logging.ERROR
-    elif verbosity == 0:
-        log_level = logging.WARNING
-    elif verbosity == 1:
-        log_level = logging.INFO
-    elif verbosity >= 2:
-        log_level = logging.DEBUG
-    else:
-        assert False, "unreachable"
 
-    return log_level
+@functools.lru_cache(maxsize=8)
+def get_log_level_for_verbosity(verbosity: int) -> int:
+    return LOG_LEVELS[max(0, min(len(LOG_LEVELS) - 1, verbosity + 2))]
@@ -1,73 +1,142 @@
+from __future__ import annotations
+
+import contextlib
 import csv
 import datetime as dt
+import functools
 import logging
-import re
+import queue
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-
-import tabulate
-from selenium.common.exceptions import TimeoutException
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
+from typing import TYPE_CHECKING, Callable, Iterator
+from urllib.parse import urlencode
 
 from job_count import __project_name__, __version__
 from job_count.browser import (
-    DEFAULT_COOKIE_DIR,
-    WebDriver,
+    Browser,
+    NotLoggedInError,
     clear_cookies,
+    default_cookie_dir,
     get_cookie_path,
+    has_live_session,
     load_cookies,
+    lock_profile_dir,
     make_driver,
+    read_cookies,
     save_cookies,
 )
 from job_count.cli import (
     ClearCookiesCliArgs,
     LoginCliArgs,
     QueryArgs,
+    ServeCliArgs,
     parse_args,
     setup_parser,
 )
+from job_count.daemon import (
+    connect_to_daemon,
+    get_daemon_browser,
+    get_socket_path,
+    make_daemon_job_counter,
+    serve,
+)
 from job_count.logging import get_log_level_for_verbosity, setup_logging
 from job_count.types import Job, JobWithCount
 
+if TYPE_CHECKING:
+    from job_count.browser import WebDriver
+
 logger = logging.getLogger(__name__)
 
 LINKEDIN_BASE_URL = "https://www.linkedin.com"
 
+# Reads the job count text in one WebDriver command, returning null until it renders
+JOB_COUNT_SCRIPT = (
+    "return document.querySelector('div.jobs-search-results-list__subtitle')"
+    "?.textContent.trim()"
+)
+
+OUTPUT_FIELDNAMES = ("job_title", "location", "ts", "count")
+
+RESULTS_TABLE_HEADERS = ("job_title", "location", "count")
+
 
 def read_jobs_to_search_for(file_path: Path) -> list[Job]:
 
     logger.info(f"Reading job to search for from {file_path}")
     with open(file_path, mode="r", encoding="utf-8") as file:
-        return [Job.model_validate(row) for row in csv.DictReader(file)]
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if header is None:
+            return []
 
+        try:
+            job_title_i = header.index("job_title")
+            location_i = header.index("location")
+        except ValueError:
+            raise ValueError(
+                f"{file_path} must have 'job_title' and 'location' columns, got "
+                f"{header}"
+            ) from None
+
+        # Every CSV field is already a str, so there is nothing for pydantic to
+        # validate or coerce beyond each row having both columns
+        min_row_length = max(job_title_i, location_i) + 1
+        jobs = []
+        for row in reader:
+            if not row:
+                continue
+            if len(row) < min_row_length:
+                raise ValueError(
+                    f"{file_path} line {reader.line_num} must have 'job_title' and "
+                    f"'location' values, got {row}"
+                )
+            jobs.append(
+                Job.model_construct(
+                    job_title=row[job_title_i], location=row[location_i]
+                )
+            )
+        return jobs
 
-def write_jobs_with_counts(file_path: Path, jobs_with_counts: list[JobWithCount]):
 
-    file_exists = Path.exists(file_path) and Path(file_path).stat().st_size > 0
-    if not file_exists:
-        Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+@contextlib.contextmanager
+def open_jobs_with_counts_writer(
+    file_path: Path,
+) -> Iterator[Callable[[JobWithCount], None]]:
+
+    file_path.parent.mkdir(parents=True, exist_ok=True)
 
     logger.info(f"Writing job counts to {file_path}")
 
-    data = [job.model_dump() for job in jobs_with_counts]
-    with open(file_path, mode="a", newline="", encoding="utf-8") as file:
-        writer = csv.DictWriter(file, fieldnames=data[0].keys())
+    with open(
+        file_path, mode="a", newline="", encoding="utf-8", buffering=1 << 20
+    ) as file:
+        writer = csv.writer(file)
+
+        # Append mode starts at the end of the file, so this is its size. Write
+        # header only if the file did not exist or was empty.
+        if file.tell() == 0:
+            writer.writerow(OUTPUT_FIELDNAMES)
 
-        # Write header only if the file does not exist or is empty
-        if not file_exists:
-            writer.writeheader()
+        def write_job_with_count(job: JobWithCount):
+            # str(ts) matches the format of files written by earlier versions
+            writer.writerow((job.job_title, job.location, str(job.ts), job.count))
 
-        writer.writerows(data)
+        yield write_job_with_count
 
 
 def make_job_search_url(job_title: str, location: str) -> str:
-    return f"{LINKEDIN_BASE_URL}/jobs/search/?keywords={job_title}&location={location}"
+    params = urlencode({"keywords": job_title, "location": location})
+    return f"{LINKEDIN_BASE_URL}/jobs/search/?{params}"
 
 
 def login_to_linkedin(driver: WebDriver, timeout_s: int, cookie_path: Path):
 
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
     driver.get(f"{LINKEDIN_BASE_URL}/login")  # Open the LinkedIn login page
 
     logger.info("Waiting for successful login...")
@@ -79,43 +148,45 @@ def login_to_linkedin(driver: WebDriver, timeout_s: int, cookie_path: Path):
     save_cookies(driver, cookie_path)
 
 
+def check_logged_in(driver: WebDriver):
+    # The feed only loads for a logged-in user; anyone else is sent to login
+    driver.get(f"{LINKEDIN_BASE_URL}/feed/")
+    if "login" in driver.current_url:
+        raise NotLoggedInError("Redirected to the login page")
+
+
 def get_job_count(driver: WebDriver, job_title: str, location: str) -> int:
 
-    url = f"{LINKEDIN_BASE_URL}/jobs/search/?keywords={job_title}&location={location}"
-    driver.get(url)
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.support.ui import WebDriverWait
 
-    wait = WebDriverWait(driver, 10)
-    wait.until(lambda d: d.execute_script("return document.readyState") == "complete")
+    driver.get(make_job_search_url(job_title, location))
 
-    element_list = driver.find_elements(
-        By.XPATH, "//div[contains(@class, 'jobs-search-results-list__subtitle')]"
-    )
-    if element_list:
-        div_element = element_list[0]
-    else:
-        try:
-            div_element = WebDriverWait(driver, 5).until(
-                EC.visibility_of_element_located(
-                    (
-                        By.XPATH,
-                        "//div[contains(@class, 'jobs-search-results-list__subtitle')]",
-                    )
-                )
-            )
-        except:
-            div_element = None
+    # Cookies are loaded without a refresh, so this is the first page load that
+    # shows whether they are still valid
+    if "login" in driver.current_url:
+        raise NotLoggedInError("Redirected to the login page")
 
-    if div_element is not None:
-        count = int(re.sub(r"[^\d]", "", div_element.text))
-    else:
+    try:
+        # Poll more often than the 0.5s default; each poll is one cheap script call
+        text = WebDriverWait(driver, 10, poll_frequency=0.1).until(
+            lambda d: d.execute_script(JOB_COUNT_SCRIPT)
+        )
+    except TimeoutException:
         raise ValueError("Could not find job count element")
 
+    # str.isdecimal keeps exactly the digits int() accepts, in any script, and
+    # filter calls it from C without a Python-level call per character
+    count = int("".join(filter(str.isdecimal, text)))
+
     return count
 
 
 def handle_login(args: LoginCliArgs):
 
-    cookie_path = get_cookie_path(args.cookie_dir or DEFAULT_COOKIE_DIR, args.browser)
+    from selenium.common.exceptions import TimeoutException
+
+    cookie_path = get_cookie_path(args.cookie_dir or default_cookie_dir(), args.browser)
     driver = make_driver(args.browser, False, args.driver_path)
 
     try:
@@ -135,73 +206,224 @@ def handle_clear_cookies(
     args: ClearCookiesCliArgs,
 ):
 
-    cookie_path = get_cookie_path(args.cookie_dir or DEFAULT_COOKIE_DIR, args.browser)
+    cookie_path = get_cookie_path(args.cookie_dir or default_cookie_dir(), args.browser)
     clear_cookies(cookie_path)
 
     print("Cookies cleared")
 
 
 def print_results_table(jobs_with_counts: list[JobWithCount]):
-    results_raw: list[dict] = []
-    for job in jobs_with_counts:
-        result_raw = {k: v for k, v in job.model_dump().items() if k != "ts"}
-        results_raw.append(result_raw)
-    table = tabulate.tabulate(results_raw, headers="keys", tablefmt="pretty")
-    print(table)
 
+    rows = [(job.job_title, job.location, str(job.count)) for job in jobs_with_counts]
+    widths = [
+        max(len(cell) for cell in column)
+        for column in zip(RESULTS_TABLE_HEADERS, *rows)
+    ]
 
-def query(
-    jobs: list[Job],
+    def format_row(row: tuple[str, ...]) -> str:
+        cells = (f"{cell:^{width}}" for cell, width in zip(row, widths))
+        return "| " + " | ".join(cells) + " |"
+
+    border = "+" + "+".join("-" * (width + 2) for width in widths) + "+"
+    lines = [border, format_row(RESULTS_TABLE_HEADERS), border]
+    lines.extend(format_row(row) for row in rows)
+    lines.append(border)
+    print("\n".join(lines))
+
+
+def make_logged_in_driver(
+    browser: Browser,
+    headless: bool,
+    driver_path: Path | None,
     cookie_path: Path,
-    driver: WebDriver,
-) -> list[JobWithCount]:
+    profile_dir: Path | None = None,
+) -> WebDriver:
 
-    driver.get(f"{LINKEDIN_BASE_URL}/feed/")
+    # Only text is read from these drivers, so skip images, styles and fonts
+    driver = make_driver(
+        browser=browser,
+        headless=headless,
+        driver_path=driver_path,
+        profile_dir=profile_dir,
+        block_resources=True,
+    )
+
+    # Cookies can only be added on a page from their domain. robots.txt is the
+    # lightest one, where the feed is a full authenticated page load.
+    driver.get(f"{LINKEDIN_BASE_URL}/robots.txt")
     cookies_loaded = load_cookies(driver, cookie_path)
 
     if not cookies_loaded:
+        driver.quit()
         logger.error("No cookies loaded. run 'job-count login' first.")
         sys.exit(0)
-    if "login" in driver.current_url:
-        logger.error(
-            "Cookies loaded but not logged in. Run 'job-count login' to "
-            "relogin first."
-        )
+
+    return driver
+
+
+def make_logged_in_drivers(
+    n: int,
+    browser: Browser,
+    headless: bool,
+    driver_path: Path | None,
+    cookie_path: Path,
+) -> list[WebDriver]:
+
+    # Check for cookies once, rather than starting every browser only for each
+    # of them to find there is nothing to load
+    if not cookie_path.exists() or not has_live_session(read_cookies(cookie_path)):
+        logger.error("No valid cookies found. run 'job-count login' first.")
         sys.exit(0)
 
-    logger.info("Logged in to LinkedIn")
+    # Each worker gets a profile of its own, not in use by any other run
+    profile_dirs = [lock_profile_dir(browser, "worker") for _ in range(n)]
+
+    # Browser startup is slow, so start all drivers at once
+    with ThreadPoolExecutor(max_workers=n) as executor:
+        futures = [
+            executor.submit(
+                make_logged_in_driver,
+                browser,
+                headless,
+                driver_path,
+                cookie_path,
+                profile_dir,
+            )
+            for profile_dir in profile_dirs
+        ]
+
+    drivers = [future.result() for future in futures if future.exception() is None]
+    for future in futures:
+        if (exc := future.exception()) is not None:
+            for driver in drivers:
+                driver.quit()
+            raise exc
+
+    return drivers
 
-    jobs_with_counts: list[JobWithCount] = []
 
-    for i, job in enumerate(jobs):
+def make_pooled_job_counter(drivers: list[WebDriver]) -> Callable[[str, str], int]:
+
+    # Each caller borrows an idle driver for the duration of one search
+    idle_drivers: queue.Queue[WebDriver] = queue.Queue()
+    for driver in drivers:
+        idle_drivers.put(driver)
+
+    def count_job(job_title: str, location: str) -> int:
+        driver = idle_drivers.get()
+        try:
+            return get_job_count(driver, job_title, location)
+        finally:
+            idle_drivers.put(driver)
+
+    return count_job
+
+
+def get_search_key(job: Job) -> tuple[str, str]:
+    # LinkedIn search is case-insensitive, so these rows would return the same count
+    return job.job_title.strip().lower(), job.location.strip().lower()
+
+
+def query(
+    jobs: list[Job],
+    count_job: Callable[[str, str], int],
+    workers: int = 1,
+    on_result: Callable[[JobWithCount], None] | None = None,
+) -> list[JobWithCount]:
+
+    unique_jobs: dict[tuple[str, str], Job] = {}
+    for job in jobs:
+        unique_jobs.setdefault(get_search_key(job), job)
+    if len(unique_jobs) < len(jobs):
+        logger.info(f"Skipping {len(jobs) - len(unique_jobs)} duplicate searches")
+
+    # Every row from one run shares a timestamp, marking the batch it came from
+    ts = dt.datetime.now(dt.timezone.utc)
+
+    def query_job(i: int, job: Job) -> JobWithCount:
 
         logger.info(
-            f"({i+1}/{len(jobs)}) - Searching for {job.job_title} jobs in {job.location}"
+            f"({i+1}/{len(unique_jobs)}) - Searching for {job.job_title} jobs in "
+            f"{job.location}"
         )
 
-        count = get_job_count(driver, job.job_title, job.location)
+        count = count_job(job.job_title, job.location)
 
-        job_with_count = JobWithCount(
+        return JobWithCount(
             job_title=job.job_title,
             location=job.location,
             count=count,
-            ts=dt.datetime.now(dt.timezone.utc),
+            ts=ts,
         )
-        jobs_with_counts.append(job_with_count)
+
+    jobs_with_counts: list[JobWithCount] = []
+    searched: dict[tuple[str, str], JobWithCount] = {}
+
+    # Searches run in order of first appearance, so each row's result is either
+    # already known or is the next one to arrive
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(query_job, range(len(unique_jobs)), unique_jobs.values())
+        for job in jobs:
+            search_key = get_search_key(job)
+            if search_key not in searched:
+                searched[search_key] = next(results)
+            result = searched[search_key]
+
+            job_with_count = JobWithCount(
+                job_title=job.job_title,
+                location=job.location,
+                count=result.count,
+                ts=result.ts,
+            )
+            if on_result is not None:
+                on_result(job_with_count)
+            jobs_with_counts.append(job_with_count)
 
     return jobs_with_counts
 
 
-def handle_query(args: QueryArgs):
+@contextlib.contextmanager
+def exit_if_not_logged_in() -> Iterator[None]:
+    try:
+        yield
+    except NotLoggedInError:
+        logger.error(
+            "Cookies loaded but not logged in. Run 'job-count login' to "
+            "relogin first."
+        )
+        sys.exit(0)
 
-    cookie_dir = args.cookie_dir or DEFAULT_COOKIE_DIR
-    cookie_path = get_cookie_path(cookie_dir=cookie_dir, browser=args.browser)
-    driver = make_driver(
+
+def query_in_process(
+    jobs: list[Job],
+    args: QueryArgs,
+    cookie_path: Path,
+    on_result: Callable[[JobWithCount], None] | None = None,
+) -> list[JobWithCount]:
+
+    # An input file with only a header has nothing to search, so don't start a
+    # browser for it
+    if not jobs:
+        return []
+
+    workers = min(args.workers, len(set(map(get_search_key, jobs))))
+    drivers = make_logged_in_drivers(
+        n=workers,
         browser=args.browser,
         headless=not args.no_headless,
         driver_path=args.driver_path,
+        cookie_path=cookie_path,
     )
 
+    try:
+        return query(jobs, make_pooled_job_counter(drivers), workers, on_result)
+    finally:
+        for driver in drivers:
+            driver.quit()
+
+
+def handle_query(args: QueryArgs):
+
     if args.input_file:
         jobs = read_jobs_to_search_for(args.input_file)
     elif args.terms:
@@ -209,17 +431,77 @@ def handle_query(args: QueryArgs):
     else:
         raise ValueError("Expected either terms or input_file")
 
-    jobs_with_counts = query(jobs=jobs, cookie_path=cookie_path, driver=driver)
+    cookie_dir = args.cookie_dir or default_cookie_dir()
+    cookie_path = get_cookie_path(cookie_dir=cookie_dir, browser=args.browser)
+
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(exit_if_not_logged_in())
 
-    driver.quit()
+        # Write each result as it arrives, so a failed run keeps what it found
+        on_result = None
+        if args.output_file:
+            on_result = stack.enter_context(
+                open_jobs_with_counts_writer(args.output_file)
+            )
+
+        # Prefer a running daemon, which already has a logged-in browser
+        socket_path = args.socket_path or get_socket_path(cookie_dir)
+        client = connect_to_daemon(socket_path)
+        if client is not None:
+            logger.info("Querying via the job-count daemon")
+            # The daemon's one browser was set up when it started, so these don't apply
+            if args.workers > 1:
+                logger.warning(
+                    f"Ignoring --workers {args.workers}; the job-count daemon "
+                    "searches with its single browser"
+                )
+            if args.driver_path or args.no_headless:
+                logger.warning(
+                    "Ignoring --driver-path and --no-headless; the job-count daemon "
+                    "uses the browser it started with"
+                )
+            with client:
+                daemon_browser = get_daemon_browser(client)
+                if daemon_browser is not None and daemon_browser != args.browser:
+                    logger.warning(
+                        f"Ignoring --browser {args.browser.value}; the job-count "
+                        f"daemon is running {daemon_browser.value}"
+                    )
+                counter = make_daemon_job_counter(client)
+                jobs_with_counts = query(jobs, counter, on_result=on_result)
+        else:
+            jobs_with_counts = query_in_process(jobs, args, cookie_path, on_result)
 
     print_results_table(jobs_with_counts)
 
     if args.output_file:
-        write_jobs_with_counts(args.output_file, jobs_with_counts)
         print(f"Results written to {args.output_file}")
 
 
+def handle_serve(args: ServeCliArgs):
+
+    cookie_dir = args.cookie_dir or default_cookie_dir()
+    cookie_path = get_cookie_path(cookie_dir=cookie_dir, browser=args.browser)
+    driver = make_logged_in_driver(
+        browser=args.browser,
+        headless=not args.no_headless,
+        driver_path=args.driver_path,
+        cookie_path=cookie_path,
+        profile_dir=lock_profile_dir(args.browser, "serve"),
+    )
+
+    socket_path = args.socket_path or get_socket_path(cookie_dir)
+    try:
+        # Every request would fail with stale cookies, so find out before serving
+        with exit_if_not_logged_in():
+            check_logged_in(driver)
+
+        print(f"Serving job counts on {socket_path}. Press Ctrl+C to stop.")
+        serve(socket_path, functools.partial(get_job_count, driver), args.browser)
+    finally:
+        driver.quit()
+
+
 def main():
 
     try:
@@ -236,6 +518,8 @@ def main():
                 handle_clear_cookies(args)
             case "query":
                 handle_query(args)
+            case "serve":
+                handle_serve(args)
             case _:
                 raise ValueError(f"Unrecognized command: {args.command}")
 
@@ -1,4 +1,5 @@
 import datetime as dt
+from dataclasses import dataclass
 
 from pydantic import BaseModel
 
@@ -17,6 +18,10 @@ class Job(BaseModel):
         return cls(job_title=terms[0].strip(), location=terms[1].strip())
 
 
-class JobWithCount(Job):
+# Only ever built from already-validated values, so it skips pydantic entirely
+@dataclass(slots=True, frozen=True)
+class JobWithCount:
+    job_title: str
+    location: str
     ts: dt.datetime
     count: int